@@ -0,0 +1,17 @@
+# Generated by Django 3.1.14 on 2026-10-18 04:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_auto_20201208_1828'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['site', 'updated', 'id'], name='vendor_product_site_upd_idx'),
+        ),
+    ]
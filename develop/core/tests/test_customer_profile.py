@@ -1,7 +1,11 @@
 from django.contrib.auth.models import User
+from datetime import timedelta
 from django.contrib.sites.models import Site
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
 from django.test import TestCase, Client
 from django.urls import reverse
+from django.utils import timezone
 
 from core.models import Product
 
@@ -77,6 +81,60 @@ class ModelCustomerProfileTests(TestCase):
         product = Product.objects.get(pk=1)
         self.assertFalse(self.customer_profile_existing.has_product(product))
 
+    def test_owns_product_cached(self):
+        cache.clear()
+        product = Product.objects.get(pk=2)
+        self.customer_profile_existing.has_product(product)
+
+        with self.assertNumQueries(0):
+            self.assertTrue(self.customer_profile_existing.has_product(product))
+
+    def test_owns_product_after_receipt_added(self):
+        cache.clear()
+        product = Product.objects.get(pk=1)
+        self.assertFalse(self.customer_profile_existing.has_product(product))
+
+        receipt = Receipt.objects.create(profile=self.customer_profile_existing, order_item=OrderItem.objects.get(pk=5), start_date=timezone.now())
+        receipt.products.add(product)
+
+        self.assertTrue(self.customer_profile_existing.has_product(product))
+
+    def test_owns_product_false_expired_receipt(self):
+        cache.clear()
+        product = Product.objects.get(pk=1)
+        receipt = Receipt.objects.create(profile=self.customer_profile_existing, order_item=OrderItem.objects.get(pk=5), start_date=timezone.now() - timedelta(days=2), end_date=timezone.now() - timedelta(days=1))
+        receipt.products.add(product)
+
+        self.assertFalse(self.customer_profile_existing.has_product(product))
+
+    def test_profiles_without_user_do_not_share_entitlements(self):
+        cache.clear()
+        anonymous_profile = CustomerProfile.objects.create()
+        other_anonymous_profile = CustomerProfile.objects.create()
+        receipt = Receipt.objects.create(profile=anonymous_profile, order_item=OrderItem.objects.get(pk=5), start_date=timezone.now())
+        receipt.products.add(Product.objects.get(pk=1))
+
+        self.assertTrue(anonymous_profile.has_product(Product.objects.get(pk=1)))
+        self.assertFalse(other_anonymous_profile.has_product(Product.objects.get(pk=1)))
+
+    def test_owns_product_queryset_checked_in_database(self):
+        cache.clear()
+        self.customer_profile_existing.get_entitlements()
+
+        with self.assertNumQueries(1):
+            self.assertTrue(self.customer_profile_existing.has_product(Product.objects.all()))
+
+    def test_entitlements_expire_on_receipt_end_date(self):
+        cache.clear()
+        end_date = timezone.now() + timedelta(days=1)
+        receipt = Receipt.objects.create(profile=self.customer_profile_existing, order_item=OrderItem.objects.get(pk=5), start_date=timezone.now(), end_date=end_date)
+        receipt.products.add(Product.objects.get(pk=1))
+
+        entitlements, expires = self.customer_profile_existing.build_entitlements(timezone.now())
+
+        self.assertEqual(entitlements, {1, 2})
+        self.assertEqual(expires, end_date)
+
     def test_get_checkout_cart(self):
         cp = CustomerProfile.objects.get(pk=1)
         invoice = cp.get_cart()
@@ -93,13 +151,61 @@ class ModelCustomerProfileTests(TestCase):
 
     def test_gets_checkout_cart(self):
         invoice = Invoice.objects.get(pk=1)
-        self.customer_profile_existing.invoices.add(Invoice.objects.create(status=Invoice.InvoiceStatus.CHECKOUT))
+        invoice.status = Invoice.InvoiceStatus.CHECKOUT
+        invoice.save()
 
         cart = self.customer_profile_existing.get_cart_or_checkout_cart()
     
         self.assertEqual(cart.status, Invoice.InvoiceStatus.CHECKOUT)
 
+    def test_gets_cart_single_query(self):
+        with self.assertNumQueries(1):
+            cart = self.customer_profile_existing.get_cart_or_checkout_cart()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(cart, self.customer_profile_existing.get_cart_or_checkout_cart())
+
+    def test_get_cart_reverts_checkout(self):
+        invoice = Invoice.objects.get(pk=1)
+        invoice.status = Invoice.InvoiceStatus.CHECKOUT
+        invoice.save()
+
+        cart = self.customer_profile_existing.get_cart()
+
+        self.assertEqual(cart.pk, invoice.pk)
+        self.assertEqual(Invoice.objects.get(pk=1).status, Invoice.InvoiceStatus.CART)
+
+    def test_open_cart_forgotten_on_status_change(self):
+        cart = self.customer_profile_existing.get_cart()
+
+        invoice = Invoice.objects.get(pk=cart.pk)
+        invoice.profile = self.customer_profile_existing
+        invoice.status = Invoice.InvoiceStatus.COMPLETE
+        invoice.save()
+
+        self.assertNotEqual(cart.pk, self.customer_profile_existing.get_cart().pk)
+
+    def test_only_one_open_cart_per_profile(self):
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                Invoice.objects.create(profile=self.customer_profile_existing, status=Invoice.InvoiceStatus.CHECKOUT)
+
 
 class ViewCustomerProfileTests(TestCase):
+
+    fixtures = ['user', 'unit_test']
+
     def setUp(self):
-        pass
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(User.objects.get(pk=1))
+
+    def test_product_access_owned(self):
+        response = self.client.get(reverse('product-access', kwargs={'slug': Offer.objects.get(pk=2).slug}))
+
+        self.assertEquals(response.status_code, 200)
+
+    def test_product_access_not_owned_redirect(self):
+        response = self.client.get(reverse('product-access', kwargs={'slug': Offer.objects.get(pk=1).slug}))
+
+        self.assertEquals(response.status_code, 302)
@@ -1,8 +1,13 @@
+from datetime import timedelta
 from django.contrib.auth import get_user_model
 from django.contrib.sites.models import Site
 from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
 from vendor.models import Offer, Price, Invoice, OrderItem, Receipt, CustomerProfile, Payment
 from vendor.forms import BillingAddressForm, CreditCardForm
@@ -16,7 +21,7 @@ class ModelInvoiceTests(TestCase):
     def setUp(self):
         self.existing_invoice = Invoice.objects.get(pk=1)
         
-        self.new_invoice = Invoice(profile=CustomerProfile.objects.get(pk=1))
+        self.new_invoice = Invoice(profile=CustomerProfile.objects.get(pk=2))
         self.new_invoice.save()
 
         self.shirt_offer = Offer.objects.get(pk=1)
@@ -26,7 +31,7 @@ class ModelInvoiceTests(TestCase):
     
     def test_default_site_id_saved(self):
         invoice = Invoice()
-        invoice.profile = CustomerProfile.objects.get(pk=1)
+        invoice.profile = CustomerProfile.objects.create(user=User.objects.get(pk=1))
         invoice.save()
 
         self.assertEquals(Site.objects.get_current(), invoice.site)
@@ -62,6 +67,113 @@ class ModelInvoiceTests(TestCase):
         self.assertEquals(add_mug_total, 355.18)
         self.assertEquals(remove_shirt_total, 345.19)
 
+    def test_update_totals_constant_queries(self):
+        # order items, offers with prices and products
+        with self.assertNumQueries(3):
+            self.existing_invoice.update_totals()
+
+        self.assertEquals(self.existing_invoice.total, 345.18)
+
+    def test_update_totals_does_not_save(self):
+        self.existing_invoice.update_totals()
+
+        self.assertTrue(self.existing_invoice.has_stale_prices())
+        self.assertNotEquals(Invoice.objects.get(pk=self.existing_invoice.pk).total, 345.18)
+
+    def test_reprice_saves_snapshots_and_totals(self):
+        self.existing_invoice.reprice()
+
+        self.assertFalse(self.existing_invoice.has_stale_prices())
+        self.assertEquals(Invoice.objects.get(pk=self.existing_invoice.pk).total, 345.18)
+
+    def test_expired_price_snapshot_is_repriced(self):
+        now = timezone.now()
+        Price.objects.create(offer=self.shirt_offer, cost=5.0, currency='usd', start_date=now - timedelta(days=1), end_date=now + timedelta(days=1), priority=10)
+        self.existing_invoice.reprice()
+        shirt_item = self.existing_invoice.order_items.get(offer=self.shirt_offer)
+        self.assertEquals(5.0, shirt_item.unit_price)
+
+        Price.objects.filter(offer=self.shirt_offer, priority=10).update(end_date=now - timedelta(seconds=1))       # Ends without signals
+        self.assertFalse(self.existing_invoice.has_stale_prices())
+        OrderItem.objects.filter(pk=shirt_item.pk).update(price_expires=now - timedelta(seconds=1))
+        cache.clear()
+        self.assertTrue(self.existing_invoice.has_stale_prices())
+
+        self.existing_invoice.add_offer(self.mug_offer)
+
+        self.assertEquals(9.99, self.existing_invoice.order_items.get(offer=self.shirt_offer).unit_price)
+        self.assertFalse(self.existing_invoice.has_stale_prices())
+
+    def test_add_offer_saves_price_snapshot(self):
+        self.existing_invoice.add_offer(self.mug_offer)
+
+        order_item = self.existing_invoice.order_items.get(offer=self.mug_offer)
+
+        self.assertEquals(order_item.unit_price, self.mug_offer.current_price())
+        self.assertEquals(order_item.line_total, order_item.quantity * order_item.unit_price)
+        self.assertFalse(self.existing_invoice.has_stale_prices())
+
+    def test_add_offer_applies_delta_to_persisted_totals(self):
+        self.existing_invoice.reprice()
+
+        self.existing_invoice.add_offer(self.mug_offer)
+        self.existing_invoice.refresh_from_db()
+
+        self.assertEquals(self.existing_invoice.subtotal, 355.18)
+        self.assertEquals(self.existing_invoice.total, 355.18)
+
+    def test_remove_offer_applies_delta_to_persisted_totals(self):
+        self.existing_invoice.reprice()
+
+        self.existing_invoice.remove_offer(self.hamster)
+        self.existing_invoice.refresh_from_db()
+
+        self.assertAlmostEqual(self.existing_invoice.total, 319.98)
+        self.assertFalse(self.existing_invoice.order_items.filter(offer=self.hamster).exists())
+
+    def test_add_offers_creates_order_items_and_totals(self):
+        self.shirt_offer.allow_multiple = True
+
+        self.new_invoice.add_offers({self.shirt_offer: 2, self.mug_offer: 3})
+        self.new_invoice.refresh_from_db()
+
+        self.assertEquals(2, self.new_invoice.order_items.get(offer=self.shirt_offer).quantity)
+        self.assertEquals(1, self.new_invoice.order_items.get(offer=self.mug_offer).quantity)      # Does not allow multiple
+        self.assertAlmostEqual(self.new_invoice.total, 2 * self.shirt_offer.current_price() + self.mug_offer.current_price())
+        self.assertFalse(self.new_invoice.has_stale_prices())
+
+    def test_add_offers_merges_existing_order_items(self):
+        self.shirt_offer.allow_multiple = True
+
+        self.existing_invoice.add_offers({self.shirt_offer: 2, self.hamster: 1})
+
+        self.assertEquals(4, self.existing_invoice.order_items.get(offer=self.shirt_offer).quantity)
+        self.assertEquals(1, self.existing_invoice.order_items.get(offer=self.hamster).quantity)
+        self.assertEquals(3, self.existing_invoice.order_items.count())
+
+    def test_add_offers_queries_do_not_grow_with_offers(self):
+        with CaptureQueriesContext(connection) as one_offer:
+            self.new_invoice.add_offers({self.shirt_offer: 1})
+
+        self.new_invoice.order_items.all().delete()
+        offer_quantities = { offer: 1 for offer in Offer.objects.all() }
+        with self.assertNumQueries(len(one_offer)):
+            self.new_invoice.add_offers(offer_quantities)
+
+    def test_price_change_clears_cart_price_snapshot(self):
+        self.existing_invoice.reprice()
+
+        price = Price.objects.get(pk=5)
+        price.cost = 30
+        price.save()
+
+        self.assertTrue(self.existing_invoice.has_stale_prices())
+
+        self.existing_invoice.add_offer(self.mug_offer)
+
+        self.assertAlmostEqual(self.existing_invoice.total, 359.98)
+        self.assertFalse(self.existing_invoice.has_stale_prices())
+
     def test_add_quantity(self):
         self.shirt_offer.allow_multiple = True
         self.shirt_offer.save()
@@ -175,6 +287,66 @@ class CartViewTests(TestCase):
         # raise NotImplementedError()
     
     
+class SessionCartViewTests(TestCase):
+
+    fixtures = ['user', 'unit_test']
+
+    def setUp(self):
+        self.client = Client()
+        self.cart_url = reverse('vendor:cart')
+        self.offers = list(Offer.on_site.order_by('pk')[:3])
+
+    def add_offers(self, offers):
+        for offer in offers:
+            self.client.post(reverse('vendor:add-to-cart', kwargs={'slug': offer.slug}))
+
+    def test_add_to_cart_saves_versioned_payload(self):
+        self.add_offers(self.offers[:2])
+
+        self.assertEquals({'v': 1, 'items': [[self.offers[0].pk, 1], [self.offers[1].pk, 1]]}, self.client.session['session_cart'])
+
+    def test_remove_from_cart_drops_offer(self):
+        self.add_offers(self.offers[:2])
+
+        self.client.post(reverse('vendor:remove-from-cart', kwargs={'slug': self.offers[0].slug}))
+
+        self.assertEquals([[self.offers[1].pk, 1]], self.client.session['session_cart']['items'])
+
+    def test_view_cart_queries_do_not_grow_with_items(self):
+        self.add_offers(self.offers[:1])
+        with self.assertNumQueries(3):      # session, offers with their price, products
+            self.client.get(self.cart_url)
+
+        self.add_offers(self.offers[1:])
+        with self.assertNumQueries(3):
+            response = self.client.get(self.cart_url)
+
+        self.assertEquals(len(self.offers), len(response.context['order_items']))
+        self.assertEquals(sum(offer.current_price() for offer in self.offers), response.context['invoice']['total'])
+
+    def test_view_cart_reads_unversioned_payload(self):
+        session = self.client.session
+        session['session_cart'] = { str(self.offers[0].pk): {'quantity': 1} }
+        session.save()
+
+        response = self.client.get(self.cart_url)
+
+        self.assertEquals([self.offers[0]], [ order_item.offer for order_item in response.context['order_items'] ])
+
+    def test_login_converts_session_cart(self):
+        self.add_offers(self.offers[:2])
+        user = User.objects.get(pk=1)
+        user.set_password('password')
+        user.save()
+
+        self.client.post(reverse('account_login'), {'login': user.username, 'password': 'password'})
+
+        cart = user.customer_profile.get(site=Site.objects.get_current()).get_cart()
+        for offer in self.offers[:2]:
+            self.assertTrue(cart.order_items.filter(offer=offer).exists())
+        self.assertNotIn('session_cart', self.client.session)
+
+
 class AccountInformationViewTests(TestCase):
 
     fixtures = ['user', 'unit_test']
@@ -338,4 +510,29 @@ class PaymentSummaryViewTests(TestCase):
         self.client.logout()
         response = self.client.get(self.view_url)
         self.assertEqual(response.status_code, 302)
-        self.assertRedirects(response, reverse('account_login')+ '?next=' + self.view_url )
\ No newline at end of file
+        self.assertRedirects(response, reverse('account_login')+ '?next=' + self.view_url )
+
+class AdminInvoiceListViewTests(TestCase):
+
+    fixtures = ['user', 'unit_test']
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(User.objects.get(pk=1))
+        self.url = reverse('vendor_admin:manager-order-list')
+        Invoice.objects.filter(pk=1).update(status=Invoice.InvoiceStatus.COMPLETE)
+
+    def test_invoice_list_pages_do_not_grow_queries(self):
+        profile = CustomerProfile.objects.get(pk=1)
+        Invoice.objects.bulk_create([ Invoice(profile=profile, site=profile.site, status=Invoice.InvoiceStatus.COMPLETE) for _ in range(60) ])
+        self.client.get(self.url)      # Warms the current site cache
+
+        with self.assertNumQueries(3):     # session, user, invoice page
+            response = self.client.get(self.url)
+        self.assertEquals(50, len(response.context['object_list']))
+        self.assertIsNotNone(response.context['next_cursor'])
+
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url, {'after': response.context['next_cursor']})
+        self.assertEquals(Invoice.on_site.filter(status__gt=Invoice.InvoiceStatus.CART).count() - 50, len(response.context['object_list']))
+        self.assertIsNone(response.context['next_cursor'])
@@ -1,10 +1,17 @@
 from django.contrib.auth.models import User  #TODO: CHANGE TO GET_USER_MODEL
+from datetime import timedelta
 from django.contrib.sites.models import Site
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase, Client
 from django.urls import reverse
 from django.utils import timezone
+from unittest.mock import patch
+from io import StringIO
 from core.models import Product
 from vendor.models import Offer, Price, OrderItem
+from vendor.models.offer import get_price_cache_key
+from vendor.views.vendor_admin import AdminOfferListView
 
 
 class ModelOfferTests(TestCase):
@@ -73,6 +80,25 @@ class ModelOfferTests(TestCase):
         offer = Offer.objects.get(pk=3)
         self.assertEquals(offer.current_price(), 25.2)
 
+    def test_with_current_price_matches_current_price(self):
+        expected = { offer.pk: offer.current_price() for offer in Offer.objects.all() }
+
+        offers = list(Offer.objects.with_current_price())
+
+        with self.assertNumQueries(0):
+            for offer in offers:
+                self.assertEquals(offer.current_price(), expected[offer.pk])
+
+    def test_with_current_price_msrp_fallback_currency(self):
+        offer = Offer.objects.with_current_price('mxn').get(pk=4)
+
+        with self.assertNumQueries(0):
+            self.assertEquals(offer.current_price('mxn'), 21.12)
+
+    def test_with_current_price_constant_queries(self):
+        with self.assertNumQueries(2):
+            [ offer.current_price() for offer in Offer.objects.with_current_price() ]
+
     def test_offer_negative_savings(self):
         offer = Offer.objects.get(pk=3)
         self.assertEquals(offer.savings(), 0.00)
@@ -142,6 +168,147 @@ class ModelOfferTests(TestCase):
 
         self.assertEquals(offer.get_best_currency('jpy'), 'usd')
     
+class OfferPriceCacheTests(TestCase):
+
+    fixtures = ['user', 'unit_test']
+
+    def setUp(self):
+        cache.clear()
+        self.offer = Offer.objects.get(pk=3)
+
+    def test_current_price_cached(self):
+        self.offer.current_price()
+
+        with self.assertNumQueries(0):
+            self.assertEquals(self.offer.current_price(), 25.2)
+
+    def test_current_price_invalidated_on_price_save(self):
+        self.offer.current_price()
+
+        price = Price.objects.get(pk=5)
+        price.cost = 30
+        price.save()
+
+        self.assertEquals(self.offer.current_price(), 30)
+
+    def test_current_price_invalidated_on_price_delete(self):
+        self.offer.current_price()
+
+        Price.objects.get(pk=5).delete()
+
+        self.assertEquals(self.offer.current_price(), 25.1)
+
+    def test_current_price_invalidated_on_products_change(self):
+        offer = Offer.objects.get(pk=4)
+        offer.current_price()
+
+        offer.products.add(Product.objects.get(pk=1))
+
+        self.assertEquals(offer.current_price(), offer.get_msrp())
+
+    def test_products_change_invalidates_once(self):
+        offer = Offer.objects.get(pk=4)
+
+        with patch('vendor.models.offer.invalidate_price_cache') as invalidate:
+            offer.products.add(Product.objects.get(pk=1))
+            Product.objects.get(pk=2).offers.add(offer)
+            Product.objects.get(pk=2).offers.clear()
+
+        self.assertEquals([[4], [4], [2, 4]], [ call.args[0] for call in invalidate.call_args_list ])      # The cheese is also in offer 2
+
+    def test_other_relations_do_not_invalidate(self):
+        with patch('vendor.models.offer.invalidate_price_cache') as invalidate:
+            Product.objects.get(pk=1).receipts.clear()
+
+        invalidate.assert_not_called()
+
+    def test_current_price_expires_on_next_price_start(self):
+        Price.objects.create(offer=self.offer, cost=5, currency='usd', priority=10, start_date=timezone.now() + timedelta(seconds=1))
+        self.assertEquals(self.offer.current_price(), 25.2)
+
+        price, expires = cache.get(get_price_cache_key(self.offer.pk))['usd']
+
+        self.assertEquals(expires, Price.objects.get(cost=5).start_date)
+
+
+class OfferMSRPTests(TestCase):
+
+    fixtures = ['user', 'unit_test']
+
+    def setUp(self):
+        cache.clear()
+        self.mug_offer = Offer.objects.get(pk=4)
+        self.mug_offer.products.add(Product.objects.get(pk=1))     # Bundle of the mug and the shirt
+        self.mug_offer.refresh_from_db()
+
+    def test_products_change_stores_msrp(self):
+        self.assertEquals(['mxn', 'usd'], self.mug_offer.msrp_currencies)
+        self.assertEquals({'usd': 29.99, 'mxn': 21.12 + 19.99}, self.mug_offer.msrp_totals)
+
+    def test_get_msrp_does_not_query_products(self):
+        with self.assertNumQueries(0):
+            self.assertEquals(29.99, self.mug_offer.get_msrp())
+            self.assertEquals('usd', self.mug_offer.get_best_currency('jpy'))
+            self.assertEquals(29.99, self.mug_offer.get_msrp('jpy'))
+
+    def test_precomputed_msrp_matches_products(self):
+        offer = Offer.objects.get(pk=4)
+        offer.msrp_currencies = offer.msrp_totals = None
+
+        for currency in ['usd', 'mxn', 'jpy']:
+            self.assertEquals(offer.get_best_currency(currency), self.mug_offer.get_best_currency(currency))
+            self.assertEquals(offer.get_msrp(currency), self.mug_offer.get_msrp(currency))
+
+    def test_product_meta_change_updates_msrp(self):
+        shirt = Product.objects.get(pk=1)
+        shirt.meta['msrp']['jpy'] = 2000
+        shirt.save()
+        self.mug_offer.refresh_from_db()
+
+        self.assertEquals(['jpy', 'mxn', 'usd'], self.mug_offer.msrp_currencies)
+        self.assertEquals(2000 + 21.12, self.mug_offer.get_msrp('jpy'))       # The mug has no yen MSRP, its default mxn one is used
+
+    def test_product_removed_updates_msrp(self):
+        self.mug_offer.products.remove(Product.objects.get(pk=1))
+        self.mug_offer.refresh_from_db()
+
+        self.assertEquals(10.0, self.mug_offer.get_msrp())
+
+    def test_product_clear_updates_msrp(self):
+        shirt = Product.objects.get(pk=1)
+        shirt.offers.clear()
+        self.mug_offer.refresh_from_db()
+
+        self.assertEquals(10.0, self.mug_offer.get_msrp())
+
+    def test_product_delete_updates_msrp(self):
+        Product.objects.get(pk=1).delete()
+        self.mug_offer.refresh_from_db()
+
+        self.assertEquals({'usd': 10.0, 'mxn': 21.12}, self.mug_offer.msrp_totals)
+
+    def test_save_after_products_change_keeps_msrp(self):
+        offer = Offer.objects.get(pk=4)
+        stale_offer = Offer.objects.get(pk=4)
+        offer.products.remove(Product.objects.get(pk=1))
+
+        self.assertEquals({'usd': 10.0, 'mxn': 21.12}, offer.msrp_totals)
+        offer.name = "Hulk Mug"
+        offer.save()
+        stale_offer.save()
+
+        self.assertEquals({'usd': 10.0, 'mxn': 21.12}, Offer.objects.get(pk=4).msrp_totals)
+
+    def test_update_offer_msrp_command(self):
+        Offer.objects.update(msrp_currencies=None, msrp_totals=None)
+        out = StringIO()
+
+        call_command('update_offer_msrp', stdout=out)
+
+        self.assertEquals({'usd': 29.99, 'mxn': 21.12 + 19.99}, Offer.objects.get(pk=4).msrp_totals)
+        self.assertIn(f"Updated the MSRP of {Offer.objects.count()} offers", out.getvalue())
+
+
 class ViewOfferTests(TestCase):
     
     fixtures = ['user', 'unit_test']
@@ -194,6 +361,26 @@ class ViewOfferTests(TestCase):
 
         self.assertContains(response, self.offer_update_uri)
 
+    def test_offers_list_keyset_pages(self):
+        site_offers = list(Offer.on_site.order_by('updated', 'pk'))
+        seen = []
+
+        with patch.object(AdminOfferListView, 'paginate_by', 2):
+            response = self.client.get(self.offers_list_uri)
+            while True:
+                seen.extend(response.context['object_list'])
+                if not response.context['next_cursor']:
+                    break
+                response = self.client.get(self.offers_list_uri, {'after': response.context['next_cursor']})
+
+        self.assertEquals(site_offers, seen)
+
+    def test_offers_list_invalid_cursor_first_page(self):
+        response = self.client.get(self.offers_list_uri, {'after': 'not-a-cursor'})
+
+        self.assertEquals(response.status_code, 200)
+        self.assertContains(response, self.mug_offer.name)
+
     def test_offer_create_status_code_success(self):
         response = self.client.get(self.offer_create_uri)
 
@@ -1,9 +1,24 @@
+import base64
+
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
 from django.contrib.auth import get_user_model
 from django.contrib.sites.models import Site
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
 from django.test import TestCase, Client
 from django.urls import reverse
+from django.utils import timezone
 
-from vendor.models import Invoice
+from vendor.config import VENDOR_PAYMENT_QUEUE_MAX_ATTEMPTS
+from vendor.encrypt import cleartext
+from vendor.forms import BillingAddressForm, CreditCardForm
+from vendor.models import Invoice, QueuedPayment, CustomerProfile
+from vendor.processors.base import PaymentProcessorBase
+from vendor.processors.queue import process_payment_queue
+from vendor.views.vendor import ReviewCheckoutView
 
 User = get_user_model()
 
@@ -49,3 +64,154 @@ class PaymentViewTests(TestCase):
         self.assertEquals(response.status_code, 302)
         self.assertIn('login', response.url)
     
+
+
+class SuccessfulPaymentProcessor(PaymentProcessorBase):
+
+    def process_payment(self):
+        self.transaction_submitted = True
+        self.transaction_id = "queued-1"
+
+
+def encode_test_data(data):
+    return base64.b64encode(data.encode()).decode()
+
+def decode_test_data(data):
+    return base64.b64decode(data).decode()
+
+
+class PaymentQueueTests(TestCase):
+
+    fixtures = ['user', 'unit_test']
+
+    def setUp(self):
+        for name, function in [('encode', encode_test_data), ('decode', decode_test_data)]:      # The queue refuses the cleartext encoder
+            encoder = patch(f'vendor.models.queue.{name}', function)
+            encoder.start()
+            self.addCleanup(encoder.stop)
+
+        self.client = Client()
+        self.client.force_login(User.objects.get(pk=1))
+        self.invoice = Invoice.objects.get(pk=1)
+        self.invoice.status = Invoice.InvoiceStatus.CHECKOUT
+        self.invoice.save()
+
+        billing_address = BillingAddressForm({'name':'Home','company':'Whitemoon Dreams','country':'581','address_1':'221B Baker Street','address_2':'','locality':'Marylebone','state':'California','postal_code':'90292'})
+        billing_address.is_valid()
+        payment_info = CreditCardForm({'full_name':'Bob Ross','card_number':'5424000000000015','expire_month':'12','expire_year':'2030','cvv_number':'900','payment_type':'10'})
+        payment_info.is_valid()
+
+        session = self.client.session
+        session['billing_address_form'] = billing_address.cleaned_data
+        session['credit_card_form'] = payment_info.cleaned_data
+        session.save()
+
+    def queue_invoice(self):
+        with patch.object(ReviewCheckoutView, 'deferred_authorization', True):
+            return self.client.post(reverse('vendor:checkout-review'))
+
+    def test_deferred_checkout_queues_invoice(self):
+        payment_count = self.invoice.payments.count()
+
+        response = self.queue_invoice()
+
+        self.assertRedirects(response, reverse('vendor:purchase-status', kwargs={'uuid': self.invoice.uuid}))
+        self.invoice.refresh_from_db()
+        self.assertEquals(Invoice.InvoiceStatus.QUEUED, self.invoice.status)
+        self.assertEquals(payment_count, self.invoice.payments.count())     # Not authorized in the request
+        queued_payment = QueuedPayment.objects.get(invoice=self.invoice)
+        self.assertEquals('Bob Ross', queued_payment.get_payment_data()['credit_card_form']['full_name'])
+
+    def test_status_page_polls_while_queued(self):
+        self.queue_invoice()
+        url = reverse('vendor:purchase-status', kwargs={'uuid': self.invoice.uuid})
+
+        self.assertEquals(200, self.client.get(url).status_code)
+        self.assertTrue(self.client.get(url, {'format': 'json'}).json()['pending'])
+
+    def test_worker_completes_invoice(self):
+        self.queue_invoice()
+
+        queued_payment, = process_payment_queue(processor_class=SuccessfulPaymentProcessor)
+
+        self.invoice.refresh_from_db()
+        self.assertEquals(Invoice.InvoiceStatus.COMPLETE, self.invoice.status)
+        self.assertEquals(QueuedPayment.QueueStatus.COMPLETE, queued_payment.status)
+        self.assertEquals("", QueuedPayment.objects.get(pk=queued_payment.pk).payment_data)
+        self.assertTrue(self.invoice.payments.filter(success=True).exists())
+        self.assertRedirects(self.client.get(reverse('vendor:purchase-status', kwargs={'uuid': self.invoice.uuid})), reverse('vendor:purchase-summary', kwargs={'uuid': self.invoice.uuid}))
+
+    def test_worker_command_fails_declined_invoice(self):
+        self.queue_invoice()
+
+        call_command('process_payment_queue', '--once', stdout=StringIO())     # The base processor never submits the transaction
+
+        self.invoice.refresh_from_db()
+        self.assertEquals(Invoice.InvoiceStatus.FAILED, self.invoice.status)
+        queued_payment = QueuedPayment.objects.get(invoice=self.invoice)
+        self.assertEquals(QueuedPayment.QueueStatus.FAILED, queued_payment.status)
+        self.assertEquals(1, queued_payment.attempts)
+        self.assertEquals("", queued_payment.payment_data)
+
+    def test_claimed_payment_not_claimed_again(self):
+        self.queue_invoice()
+
+        self.assertEquals(1, len(QueuedPayment.claim(limit=5)))
+        self.assertEquals([], QueuedPayment.claim(limit=5))
+        self.assertEquals(Invoice.InvoiceStatus.PROCESSING, Invoice.objects.get(pk=1).status)
+
+    def test_stale_claim_claimed_again(self):
+        self.queue_invoice()
+        QueuedPayment.claim()
+        QueuedPayment.objects.update(started=timezone.now() - timedelta(days=1))        # The worker stopped
+
+        queued_payment, = QueuedPayment.claim(limit=5)
+
+        self.assertEquals(2, queued_payment.attempts)
+        self.assertEquals(QueuedPayment.QueueStatus.PROCESSING, queued_payment.status)
+
+    def test_reclaimed_payment_not_charged_again(self):
+        self.queue_invoice()
+        process_payment_queue(processor_class=SuccessfulPaymentProcessor)
+        QueuedPayment.objects.update(status=QueuedPayment.QueueStatus.PROCESSING, started=timezone.now() - timedelta(days=1))     # The worker stopped before finishing
+        payment_count = self.invoice.payments.count()
+
+        with patch.object(SuccessfulPaymentProcessor, 'process_payment') as process_payment:
+            queued_payment, = process_payment_queue(processor_class=SuccessfulPaymentProcessor)
+
+        process_payment.assert_not_called()
+        self.assertEquals(payment_count, self.invoice.payments.count())
+        self.assertEquals(QueuedPayment.QueueStatus.COMPLETE, queued_payment.status)
+        self.assertEquals(Invoice.InvoiceStatus.COMPLETE, Invoice.objects.get(pk=1).status)
+
+    def test_payment_fails_after_max_attempts(self):
+        self.queue_invoice()
+        QueuedPayment.objects.update(status=QueuedPayment.QueueStatus.PROCESSING, started=timezone.now() - timedelta(days=1), attempts=VENDOR_PAYMENT_QUEUE_MAX_ATTEMPTS)
+
+        queued_payment, = process_payment_queue(processor_class=SuccessfulPaymentProcessor)
+
+        self.assertEquals(QueuedPayment.QueueStatus.FAILED, queued_payment.status)
+        self.assertEquals(Invoice.InvoiceStatus.FAILED, Invoice.objects.get(pk=1).status)
+
+    def test_processor_setup_error_fails_payment(self):
+        self.queue_invoice()
+
+        with patch.object(SuccessfulPaymentProcessor, 'processor_setup', side_effect=ValueError("Missing keys")):
+            queued_payment, = process_payment_queue(processor_class=SuccessfulPaymentProcessor)
+
+        self.assertEquals(QueuedPayment.QueueStatus.FAILED, queued_payment.status)
+        self.assertEquals("Missing keys", queued_payment.message)
+        self.assertEquals(Invoice.InvoiceStatus.FAILED, Invoice.objects.get(pk=1).status)
+
+    def test_enqueue_refuses_cleartext_encoder(self):
+        with patch('vendor.models.queue.encode', cleartext.encode):
+            with self.assertRaises(ImproperlyConfigured):
+                QueuedPayment.enqueue(self.invoice, {}, {})
+
+    def test_declined_payment_fails_invoice_when_profile_has_new_cart(self):
+        self.queue_invoice()
+        CustomerProfile.objects.get(pk=1).invoices.create(status=Invoice.InvoiceStatus.CART)       # Shopping while the payment is queued
+
+        process_payment_queue()     # The base processor never submits the transaction
+
+        self.assertEquals(Invoice.InvoiceStatus.FAILED, Invoice.objects.get(pk=1).status)
@@ -1,10 +1,19 @@
+from datetime import timedelta
+from io import StringIO
+
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
 from django.contrib.sites.models import Site
 from django.test import TestCase, Client
 from django.urls import reverse
+from django.utils import timezone
 
 from core.models import Product
 from vendor.models import Offer, Price, Invoice, OrderItem, Receipt, CustomerProfile
+from vendor.config import VENDOR_RENEWAL_CLAIM_TIMEOUT
+from vendor.models.choice import PurchaseStatus
+from vendor.processors.renewal import sweep_receipts, vendor_subscription_renewal_due
 
 class ReceiptModelTests(TestCase):
 
@@ -36,4 +45,108 @@ class ReceiptViewTests(TestCase):
     def test_view_receipt_status_code(self):
         # TODO: Implement Test
         pass
-    
\ No newline at end of file
+    
+
+class ReceiptSweepTests(TestCase):
+
+    fixtures = ['user', 'unit_test']
+
+    def setUp(self):
+        cache.clear()
+        self.profile = CustomerProfile.objects.get(pk=1)
+        self.product = Product.objects.get(pk=1)
+        self.now = timezone.now()
+
+    def create_receipt(self, end_date, auto_renew=False, status=PurchaseStatus.COMPLETE):
+        receipt = Receipt.objects.create(profile=self.profile, order_item=OrderItem.objects.get(pk=5), start_date=self.now - timedelta(days=30), end_date=end_date, auto_renew=auto_renew, status=status)
+        receipt.products.add(self.product)
+        return receipt
+
+    def renew_for_a_month(self, sender, receipts, **kwargs):
+        for receipt in receipts:
+            receipt.end_date = receipt.end_date + timedelta(days=30)
+
+    def test_ended_receipts_expired(self):
+        ended = self.create_receipt(self.now - timedelta(days=1))
+        canceled = self.create_receipt(self.now - timedelta(days=1), auto_renew=True, status=PurchaseStatus.CANCELED)
+        current = self.create_receipt(self.now + timedelta(days=1))
+
+        summary = sweep_receipts(self.now, chunk_size=1)
+
+        self.assertEquals(2, summary['expired'])
+        self.assertEquals(PurchaseStatus.EXPIRED, Receipt.objects.get(pk=ended.pk).status)
+        self.assertEquals(PurchaseStatus.EXPIRED, Receipt.objects.get(pk=canceled.pk).status)
+        self.assertEquals(PurchaseStatus.COMPLETE, Receipt.objects.get(pk=current.pk).status)
+
+    def test_due_receipts_renewed_by_receiver(self):
+        due = self.create_receipt(self.now - timedelta(days=5), auto_renew=True)
+        vendor_subscription_renewal_due.connect(self.renew_for_a_month)
+        try:
+            summary = sweep_receipts(self.now)
+        finally:
+            vendor_subscription_renewal_due.disconnect(self.renew_for_a_month)
+
+        self.assertEquals({'expired': 0, 'renewed': 1}, summary)
+        receipt = Receipt.objects.get(pk=due.pk)
+        self.assertEquals(PurchaseStatus.COMPLETE, receipt.status)
+        self.assertGreater(receipt.end_date, self.now)
+
+    def test_due_receipts_expire_after_grace_period(self):
+        waiting = self.create_receipt(self.now - timedelta(days=1), auto_renew=True)
+        overdue = self.create_receipt(self.now - timedelta(days=5), auto_renew=True)
+
+        summary = sweep_receipts(self.now, grace_days=3)
+
+        self.assertEquals({'expired': 1, 'renewed': 0}, summary)
+        self.assertEquals(PurchaseStatus.COMPLETE, Receipt.objects.get(pk=waiting.pk).status)
+        self.assertEquals(PurchaseStatus.EXPIRED, Receipt.objects.get(pk=overdue.pk).status)
+
+    def test_receipts_claimed_while_renewed(self):
+        due = self.create_receipt(self.now - timedelta(days=5), auto_renew=True)
+        claims = []
+        def record_claims(sender, receipts, **kwargs):
+            claims.extend(Receipt.objects.filter(pk__in=[ receipt.pk for receipt in receipts ]).values_list('claimed', flat=True))
+        vendor_subscription_renewal_due.connect(record_claims)
+        try:
+            sweep_receipts(self.now)
+        finally:
+            vendor_subscription_renewal_due.disconnect(record_claims)
+
+        self.assertEquals(1, len(claims))
+        self.assertIsNotNone(claims[0])
+        self.assertIsNone(Receipt.objects.get(pk=due.pk).claimed)
+
+    def test_claimed_receipts_skipped(self):
+        ended = self.create_receipt(self.now - timedelta(days=1))
+        Receipt.objects.filter(pk=ended.pk).update(claimed=timezone.now())
+
+        self.assertEquals(0, sweep_receipts(self.now)['expired'])
+
+        Receipt.objects.filter(pk=ended.pk).update(claimed=timezone.now() - timedelta(seconds=VENDOR_RENEWAL_CLAIM_TIMEOUT + 1))
+
+        self.assertEquals(1, sweep_receipts(self.now)['expired'])
+
+    def test_expired_receipts_not_entitled(self):
+        receipt = self.create_receipt(self.now + timedelta(days=1))
+        self.assertTrue(self.profile.has_product(self.product))
+        Receipt.objects.filter(pk=receipt.pk).update(status=PurchaseStatus.EXPIRED)
+        cache.clear()
+
+        self.assertFalse(self.profile.has_product(self.product))
+        self.assertFalse(self.profile.filter_products(self.product).exists())
+
+    def test_sweep_invalidates_entitlements(self):
+        self.create_receipt(self.now + timedelta(seconds=1))
+        self.assertTrue(self.profile.has_product(self.product))
+
+        sweep_receipts(self.now + timedelta(days=1))
+
+        self.assertFalse(self.profile.has_product(self.product))
+
+    def test_sweep_command(self):
+        self.create_receipt(self.now - timedelta(days=1))
+        out = StringIO()
+
+        call_command('sweep_receipts', stdout=out)
+
+        self.assertIn("Expired 1", out.getvalue())
@@ -0,0 +1,144 @@
+import gzip
+import io
+import json
+
+from django.contrib.auth.models import User
+from django.test import TestCase, Client
+from django.urls import reverse
+from unittest import skipIf
+
+from core.models import Product
+from vendor.models import Offer, Receipt, CustomerProfile, Invoice
+from vendor.views.report import pyarrow, ParquetReportSerializer
+
+
+class ReceiptListCSVTests(TestCase):
+
+    fixtures = ['user', 'unit_test']
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.get(pk=1)
+        self.client.force_login(self.user)
+        self.url = reverse('vendor_admin:manager-receipt-download')
+
+    def create_receipts(self, count):
+        profile = CustomerProfile.objects.get(pk=1)
+        order_item = profile.invoices.get(pk=1).order_items.first()
+        product = Product.objects.get(pk=1)
+        for receipt in Receipt.objects.bulk_create([ Receipt(profile=profile, order_item=order_item) for _ in range(count) ]):
+            Receipt.objects.get(uuid=receipt.uuid).products.add(product)
+
+    def get_rows(self, response):
+        return b"".join(response.streaming_content).decode().splitlines()
+
+    def test_receipt_csv_streams_rows(self):
+        response = self.client.post(self.url)
+
+        self.assertEquals(200, response.status_code)
+        self.assertTrue(response.streaming)
+        rows = self.get_rows(response)
+        self.assertTrue(rows[0].startswith("Order ID,Title"))
+        self.assertEquals(Receipt.objects.filter(profile__site__pk=1).count() + 1, len(rows))
+
+    def test_receipt_csv_queries_do_not_grow_with_rows(self):
+        self.create_receipts(2)
+        self.get_rows(self.client.post(self.url))     # Warms the current site cache
+        with self.assertNumQueries(4):     # receipts, products, offers, offer products for msrp prices
+            rows = self.get_rows(self.client.post(self.url))
+        self.assertEquals(Receipt.objects.filter(profile__site__pk=1).count() + 1, len(rows))
+
+        self.create_receipts(10)
+        with self.assertNumQueries(4):
+            rows = self.get_rows(self.client.post(self.url))
+        self.assertEquals(Receipt.objects.filter(profile__site__pk=1).count() + 1, len(rows))
+
+
+class InvoiceListCSVTests(TestCase):
+
+    fixtures = ['user', 'unit_test']
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(User.objects.get(pk=1))
+
+    def test_invoice_csv_streams_rows(self):
+        response = self.client.get(reverse('vendor_admin:manager-invoice-download'))
+
+        self.assertEquals(200, response.status_code)
+        rows = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEquals("INVOICE_ID,CREATED_TIME(ISO),USERNAME,CURRENCY,TOTAL", rows[0])
+
+
+class ReportFormatTests(TestCase):
+
+    fixtures = ['user', 'unit_test']
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(User.objects.get(pk=1))
+        self.url = reverse('vendor_admin:manager-receipt-download')
+        self.receipt_count = Receipt.objects.filter(profile__site__pk=1).count()
+
+    def get_content(self, response):
+        return b"".join(response.streaming_content)
+
+    def test_gzip_csv_format(self):
+        response = self.client.post(self.url + "?format=csv.gz")
+
+        self.assertEquals("application/gzip", response['Content-Type'])
+        self.assertIn('receipts.csv.gz', response['Content-Disposition'])
+        rows = gzip.decompress(self.get_content(response)).decode().splitlines()
+        self.assertEquals(self.receipt_count + 1, len(rows))
+
+    def test_ndjson_format(self):
+        response = self.client.post(self.url + "?format=ndjson")
+
+        self.assertEquals("application/x-ndjson", response['Content-Type'])
+        rows = [ json.loads(line) for line in self.get_content(response).decode().splitlines() ]
+        self.assertEquals(self.receipt_count, len(rows))
+        self.assertIn('Order ID', rows[0])
+
+    def test_unknown_format_bad_request(self):
+        response = self.client.post(self.url + "?format=xls")
+
+        self.assertEquals(400, response.status_code)
+
+    @skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_parquet_format(self):
+        response = self.client.post(self.url + "?format=parquet")
+
+        self.assertEquals("application/vnd.apache.parquet", response['Content-Type'])
+        table = pyarrow.parquet.read_table(io.BytesIO(self.get_content(response)))
+        self.assertEquals(self.receipt_count, table.num_rows)
+        self.assertIn('Order ID', table.column_names)
+
+    @skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_arrow_format(self):
+        response = self.client.get(reverse('vendor_admin:manager-invoice-download') + "?format=arrow")
+
+        table = pyarrow.ipc.open_stream(self.get_content(response)).read_all()
+        self.assertEquals(Invoice.on_site.count(), table.num_rows)
+        self.assertEquals("TOTAL", table.column_names[-1])
+
+    @skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_parquet_row_group_per_chunk(self):
+        rows = [["NAME", "COUNT"]] + [ [f"Row {idx}", idx if idx % 2 else float(idx)] for idx in range(5) ]
+
+        content = b"".join(ParquetReportSerializer(chunk_size=2, column_types=['string', 'float']).serialize(rows))
+
+        parquet_file = pyarrow.parquet.ParquetFile(io.BytesIO(content))
+        self.assertEquals(3, parquet_file.num_row_groups)
+        self.assertEquals([0.0, 1.0, 2.0, 3.0, 4.0], parquet_file.read().column("COUNT").to_pylist())
+
+    @skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_parquet_schema_declared_from_columns(self):
+        rows = [["NAME", "TOTAL", "UNITS", "NOTE"], ["Row 0", 1, 2, None], ["Row 1", None, float('nan'), 3], ["Row 2", "", 4.0, "Gift"]]
+
+        content = b"".join(ParquetReportSerializer(chunk_size=1, column_types=['string', 'float', 'integer']).serialize(rows))
+
+        table = pyarrow.parquet.read_table(io.BytesIO(content))
+        self.assertEquals([pyarrow.string(), pyarrow.float64(), pyarrow.int64(), pyarrow.string()], table.schema.types)
+        self.assertEquals([1.0, None, None], table.column("TOTAL").to_pylist())
+        self.assertEquals([2, None, 4], table.column("UNITS").to_pylist())
+        self.assertEquals([None, "3", "Gift"], table.column("NOTE").to_pylist())
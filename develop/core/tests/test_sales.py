@@ -0,0 +1,144 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.utils import timezone
+
+from vendor.models import DailySalesAggregate, Invoice, Offer, OrderItem, Price
+
+User = get_user_model()
+
+
+class DailySalesAggregateTests(TestCase):
+
+    fixtures = ['user', 'unit_test']
+
+    def setUp(self):
+        self.invoice = Invoice.objects.get(pk=1)
+        self.invoice.reprice()
+
+    def get_sales(self):
+        return { aggregate.offer_id: aggregate for aggregate in DailySalesAggregate.objects.filter(site=self.invoice.site) }
+
+    def test_complete_invoice_adds_sales(self):
+        self.invoice.status = Invoice.InvoiceStatus.COMPLETE
+        self.invoice.save()
+
+        sales = self.get_sales()
+        self.assertEquals({1, 2, 3}, set(sales))
+        self.assertEquals(4, sales[2].units)
+        self.assertAlmostEquals(300, sales[2].revenue)
+        self.assertAlmostEquals(19.98, sales[1].revenue)
+        self.assertEquals(timezone.localdate(), sales[1].date)
+
+    def test_saving_complete_invoice_again_does_not_double_count(self):
+        self.invoice.status = Invoice.InvoiceStatus.COMPLETE
+        self.invoice.save()
+        self.invoice.save()
+        Invoice.objects.get(pk=1).save()
+
+        self.assertEquals(4, self.get_sales()[2].units)
+
+    def test_invoice_completed_again_does_not_double_count(self):
+        self.invoice.status = Invoice.InvoiceStatus.COMPLETE
+        self.invoice.save()
+        self.invoice.status = Invoice.InvoiceStatus.FAILED
+        self.invoice.save()
+        self.invoice.status = Invoice.InvoiceStatus.COMPLETE
+        self.invoice.save()
+
+        self.assertEquals(4, self.get_sales()[2].units)
+
+    def test_revenue_uses_price_snapshot(self):
+        Price.objects.filter(offer=1).update(cost=1000)        # Without signals, the snapshot keeps the charged price
+        self.invoice.status = Invoice.InvoiceStatus.COMPLETE
+        self.invoice.save()
+
+        self.assertAlmostEquals(19.98, self.get_sales()[1].revenue)
+
+    def test_revenue_without_snapshots_shares_subtotal(self):
+        OrderItem.objects.filter(invoice=self.invoice).update(unit_price=None, line_total=None)
+        Price.objects.filter(offer=1).update(cost=1000)
+        self.invoice.status = Invoice.InvoiceStatus.COMPLETE
+        self.invoice.save()
+
+        self.assertAlmostEquals(self.invoice.subtotal, sum(aggregate.revenue for aggregate in self.get_sales().values()))
+
+    def test_refund_invoice_adds_refunds(self):
+        self.invoice.status = Invoice.InvoiceStatus.COMPLETE
+        self.invoice.save()
+        self.invoice.status = Invoice.InvoiceStatus.REFUNDED
+        self.invoice.save()
+
+        sales = self.get_sales()
+        self.assertAlmostEquals(300, sales[2].refunds)
+        self.assertEquals(4, sales[2].refunded_units)
+        self.assertAlmostEquals(0, sales[2].net_revenue)
+
+    def test_new_subscriptions_counted(self):
+        self.invoice.add_offer(Offer.objects.get(pk=4))
+        self.invoice.status = Invoice.InvoiceStatus.COMPLETE
+        self.invoice.save()
+
+        sales = self.get_sales()
+        self.assertEquals(1, sales[4].new_subscriptions)
+        self.assertEquals(0, sales[2].new_subscriptions)
+
+    def test_backfill_matches_incremental_aggregates(self):
+        self.invoice.status = Invoice.InvoiceStatus.COMPLETE
+        self.invoice.save()
+        self.invoice.status = Invoice.InvoiceStatus.REFUNDED
+        self.invoice.save()
+        fields = ['site', 'offer', 'currency', 'date', 'revenue', 'units', 'refunds', 'refunded_units', 'new_subscriptions']
+        incremental = sorted(DailySalesAggregate.objects.values_list(*fields))
+
+        DailySalesAggregate.objects.all().delete()
+        call_command('backfill_sales_aggregates', stdout=StringIO())
+
+        self.assertEquals(incremental, sorted(DailySalesAggregate.objects.values_list(*fields)))
+
+    def test_backfilled_invoice_not_added_again(self):
+        Invoice.objects.filter(pk=1).update(status=Invoice.InvoiceStatus.COMPLETE)       # Completed without signals
+        call_command('backfill_sales_aggregates', stdout=StringIO())
+
+        self.invoice.status = Invoice.InvoiceStatus.COMPLETE
+        self.invoice.save()
+
+        self.assertEquals(4, self.get_sales()[2].units)
+
+    def test_backfill_outside_date_range_keeps_nothing(self):
+        self.invoice.status = Invoice.InvoiceStatus.COMPLETE
+        self.invoice.save()
+
+        call_command('backfill_sales_aggregates', '--end-date', '2000-01-01', stdout=StringIO())
+
+        self.assertTrue(DailySalesAggregate.objects.exists())       # Rows after the range are left alone
+        call_command('backfill_sales_aggregates', '--start-date', '2000-01-01', '--end-date', '2000-01-02', stdout=StringIO())
+        self.assertEquals(3, DailySalesAggregate.objects.count())
+
+
+class DailySalesViewTests(TestCase):
+
+    fixtures = ['user', 'unit_test']
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(User.objects.get(pk=1))
+        invoice = Invoice.objects.get(pk=1)
+        invoice.update_totals()
+        invoice.status = Invoice.InvoiceStatus.COMPLETE
+        invoice.save()
+
+    def test_dashboard_shows_sales_summary(self):
+        response = self.client.get(reverse("vendor_admin:manager-dashboard"))
+
+        self.assertEquals(1, len(response.context['sales_summary']))
+        self.assertEquals(4 + 1 + 2, response.context['sales_summary'][0]['units'])
+
+    def test_daily_sales_csv(self):
+        response = self.client.get(reverse("vendor_admin:manager-sales-download"))
+
+        rows = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEquals(4, len(rows))
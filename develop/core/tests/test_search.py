@@ -0,0 +1,89 @@
+from django.contrib.sites.models import Site
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.utils import timezone
+from core.models import Product
+from vendor.models import Offer, OfferSearchDocument
+from vendor.models.search import index_offers, search_offers, tokenize
+
+
+class OfferSearchTests(TestCase):
+
+    fixtures = ['user', 'unit_test']
+
+    def setUp(self):
+        index_offers()
+        self.site = Site.objects.get_current()
+        self.cheese = Offer.objects.get(pk=2)
+        self.hamster = Offer.objects.get(pk=3)
+        self.free_mug = Offer.objects.get(pk=5)
+
+    def test_tokenize(self):
+        self.assertEquals(['creme', 'brulee', 'x1'], tokenize("Crème Brûlée, a X1!"))
+        self.assertEquals(['hw', '2000', 'spare', 'part'], tokenize("HW-2000 spare_part"))
+
+    def test_documents_store_tokenized_text(self):
+        offer = Offer.objects.create(name="Crème Brûlée Torch", start_date=timezone.now())
+        offer.products.add(Product.objects.get(pk=1))
+
+        self.assertEquals("creme brulee torch", OfferSearchDocument.objects.get(pk=offer.pk).name)
+        self.assertEquals([offer], search_offers("brûlée", available=None))
+
+    def test_search_offer_name_with_prefix(self):
+        self.assertEquals([self.hamster], search_offers("hamster whe", available=None))
+
+    def test_search_product_name(self):
+        self.assertEquals([self.cheese], search_offers("cheddar", available=None))
+
+    def test_search_requires_every_word(self):
+        self.assertEquals([], search_offers("hamster cheddar", available=None))
+
+    def test_search_only_available_by_default(self):
+        self.assertEquals([self.free_mug], search_offers("hulk"))
+
+    def test_search_filters_site(self):
+        other_site = Site.objects.create(domain="other.example.com", name="Other")
+
+        self.assertEquals([], search_offers("hulk", site=other_site))
+        self.assertEquals([self.free_mug], search_offers("hulk", site=self.site))
+
+    def test_search_ranks_name_before_description(self):
+        offer = Offer.objects.create(name="Rodent Gym", start_date=timezone.now(), offer_description="Better than a hamster wheel")
+        offer.products.add(Product.objects.get(pk=1))
+
+        self.assertEquals([self.hamster, offer], search_offers("hamster", available=None))
+
+    def test_product_changes_reindex_offers(self):
+        product = Product.objects.get(pk=3)
+        product.sku = "HW-2000"
+        product.description = {'call out': "Silent spinning"}
+        product.save()
+
+        self.assertEquals([self.hamster], search_offers("hw 2000", available=None))
+        self.assertEquals([self.hamster], search_offers("silent", available=None))
+
+    def test_offer_products_change_reindexes_offer(self):
+        self.hamster.products.add(Product.objects.get(pk=2))
+        self.assertEquals([self.cheese, self.hamster], sorted(search_offers("cheddar", available=None), key=lambda offer: offer.pk))
+
+        self.hamster.products.clear()
+        self.assertEquals([self.cheese], search_offers("cheddar", available=None))
+
+    def test_offer_delete_removes_document(self):
+        self.hamster.delete()
+
+        self.assertFalse(OfferSearchDocument.objects.filter(pk=3).exists())
+
+    def test_search_queries_do_not_grow_with_results(self):
+        with self.assertNumQueries(2):      # Ranked documents on PostgreSQL, or term postings on the other databases, then the offers
+            search_offers("wheel", available=None)
+
+    def test_search_view_json(self):
+        response = Client().get(reverse('vendor:offer-search'), {'q': "hulk", 'format': 'json'})
+
+        self.assertEquals([self.free_mug.slug], [ result['slug'] for result in response.json()['results'] ])
+
+    def test_search_view(self):
+        response = Client().get(reverse('vendor:offer-search'), {'q': "hulk"})
+
+        self.assertContains(response, self.free_mug.name)
@@ -0,0 +1,128 @@
+from datetime import timedelta
+from django.contrib.sites.models import Site
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.utils import timezone
+from io import StringIO
+from unittest.mock import patch
+from core.models import Product
+from vendor.models import Offer, Price, StorefrontOffer
+from vendor.models.storefront import get_storefront_offers, rebuild_storefront, rebuild_pending_storefront
+
+
+class StorefrontOfferTests(TestCase):
+
+    fixtures = ['user', 'unit_test']
+
+    def setUp(self):
+        cache.clear()
+        self.site = Site.objects.get_current()
+        self.shirt_offer = Offer.objects.get(pk=1)
+        self.hamster = Offer.objects.get(pk=3)
+        Offer.objects.filter(pk__in=[self.shirt_offer.pk, self.hamster.pk]).update(available=True)
+        rebuild_storefront()
+        rebuild_pending_storefront()
+
+    # The test transaction never commits, the scheduled rebuilds are run by hand.
+    def test_rebuild_saves_available_offers_per_currency(self):
+        self.assertEquals(3, StorefrontOffer.objects.filter(currency='usd').count())
+        self.assertEquals(3, StorefrontOffer.objects.filter(currency='jpy').count())
+        self.assertFalse(StorefrontOffer.objects.filter(offer=2).exists())
+
+        storefront_offer = StorefrontOffer.objects.get(offer=self.hamster, currency='usd')
+        self.assertEquals(self.hamster.current_price(), storefront_offer.price)
+        self.assertEquals(self.hamster.get_msrp(), storefront_offer.msrp)
+        self.assertEquals(self.hamster.savings(), storefront_offer.savings)
+        self.assertEquals(self.hamster.description, storefront_offer.description)
+        self.assertEquals(['Hamster Wheel'], [ product['name'] for product in storefront_offer.products ])
+
+    def test_price_change_rebuilds_offer(self):
+        Price.objects.create(offer=self.shirt_offer, cost=5.0, currency='usd', start_date=timezone.now() - timedelta(days=1), priority=10)
+        rebuild_pending_storefront()
+
+        self.assertEquals(5.0, StorefrontOffer.objects.get(offer=self.shirt_offer, currency='usd').price)
+
+    def test_offer_unavailable_removed(self):
+        self.shirt_offer.available = False
+        self.shirt_offer.save()
+        rebuild_pending_storefront()
+
+        self.assertFalse(StorefrontOffer.objects.filter(offer=self.shirt_offer).exists())
+
+    def test_product_change_rebuilds_offers(self):
+        product = self.shirt_offer.products.first()
+        product.name = "Mouse Hoodie"
+        product.save()
+        rebuild_pending_storefront()
+
+        self.assertEquals("Mouse Hoodie", StorefrontOffer.objects.get(offer=self.shirt_offer, currency='usd').products[0]['name'])
+
+    def test_product_delete_rebuilds_offers(self):
+        self.shirt_offer.products.first().delete()
+        rebuild_pending_storefront()
+
+        self.assertFalse(StorefrontOffer.objects.filter(offer=self.shirt_offer).exists())      # No products left to list
+
+    def test_products_change_rebuilds_once(self):
+        with patch('vendor.models.storefront.rebuild_storefront') as rebuild:
+            self.hamster.products.add(Product.objects.get(pk=1))
+            self.hamster.name = "Hamster Wheel and Shirt"
+            self.hamster.save()
+            rebuild_pending_storefront()
+
+        rebuild.assert_called_once_with({self.hamster.pk})
+
+    def test_listing_is_one_query(self):
+        with self.assertNumQueries(1):
+            storefront_offers = get_storefront_offers(self.site)
+
+        self.assertEquals([1, 3, 5], [ storefront_offer.offer_id for storefront_offer in storefront_offers ])
+
+    def test_listing_built_from_offers_without_snapshots(self):
+        StorefrontOffer.objects.all().delete()
+
+        storefront_offers = get_storefront_offers(self.site)
+
+        self.assertEquals([1, 3, 5], [ storefront_offer.offer_id for storefront_offer in storefront_offers ])
+        self.assertEquals(self.hamster.current_price(), storefront_offers[1].price)
+        self.assertFalse(StorefrontOffer.objects.exists())
+
+    def test_listing_reprices_expired_without_saving(self):
+        now = timezone.now()
+        self.expire_shirt_price(now)
+
+        storefront_offers = { storefront_offer.offer_id: storefront_offer for storefront_offer in get_storefront_offers(self.site) }
+
+        self.assertEquals(9.99, storefront_offers[self.shirt_offer.pk].price)
+        self.assertEquals(5.0, StorefrontOffer.objects.get(offer=self.shirt_offer, currency='usd').price)
+
+    def test_rebuild_expired_command(self):
+        self.expire_shirt_price(timezone.now())
+        out = StringIO()
+
+        call_command('rebuild_storefront', '--expired', stdout=out)
+
+        self.assertIn("Saved 3 storefront offers", out.getvalue())        # The shirt offer in every currency
+        self.assertEquals(9.99, StorefrontOffer.objects.get(offer=self.shirt_offer, currency='usd').price)
+
+    def expire_shirt_price(self, now):
+        Price.objects.create(offer=self.shirt_offer, cost=5.0, currency='usd', start_date=now - timedelta(days=1), end_date=now + timedelta(days=1), priority=10)
+        rebuild_pending_storefront()
+        Price.objects.filter(offer=self.shirt_offer, priority=10).update(end_date=now - timedelta(seconds=1))       # Ends without signals
+        StorefrontOffer.objects.filter(offer=self.shirt_offer).update(price_expires=now - timedelta(seconds=1))
+
+    def test_rebuild_storefront_command(self):
+        StorefrontOffer.objects.all().delete()
+        out = StringIO()
+
+        call_command('rebuild_storefront', '--currency', 'usd', stdout=out)
+
+        self.assertIn("Saved 3 storefront offers", out.getvalue())
+
+    def test_index_view_lists_storefront(self):
+        response = Client().get(reverse('vendor_index'))
+
+        self.assertContains(response, self.shirt_offer.name)
+        self.assertContains(response, self.hamster.add_to_cart_link())
@@ -0,0 +1,121 @@
+import hashlib
+import hmac
+import json
+
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Product
+from vendor.models import CustomerProfile, OrderItem, Payment, Receipt, WebhookEvent
+from vendor.models.choice import PurchaseStatus
+from vendor.processors.webhook import drain_webhook_events
+
+SIGNATURE_KEY = "4B7A1C1F0E8D2A6C9B3E5D7F1A2C4E6B"
+
+
+@override_settings(AUTHORIZE_NET_SIGNATURE_KEY=SIGNATURE_KEY)
+class AuthorizeNetWebhookTests(TestCase):
+
+    fixtures = ['user', 'unit_test']
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.url = reverse('vendor:webhook-authorizenet')
+        self.profile = CustomerProfile.objects.get(pk=1)
+
+    def post_event(self, event_type, entity_id, notification_id="n-1", signature=None, **payload):
+        body = json.dumps({
+            'notificationId': notification_id,
+            'eventType': event_type,
+            'eventDate': "2021-01-01T00:00:00Z",
+            'webhookId': "w-1",
+            'payload': {'entityName': 'subscription' if 'subscription' in event_type else 'transaction', 'id': entity_id, **payload},
+        }).encode()
+        if signature is None:
+            signature = "sha512=" + hmac.new(SIGNATURE_KEY.encode(), body, hashlib.sha512).hexdigest().upper()
+        return self.client.post(self.url, body, content_type='application/json', HTTP_X_ANET_SIGNATURE=signature)
+
+    def test_event_stored(self):
+        response = self.post_event('net.authorize.payment.void.created', '1234')
+
+        self.assertEquals(200, response.status_code)
+        event = WebhookEvent.objects.get()
+        self.assertEquals('net.authorize.payment.void.created', event.event_type)
+        self.assertIsNone(event.processed)
+
+    def test_invalid_signature_rejected(self):
+        response = self.post_event('net.authorize.payment.void.created', '1234', signature="sha512=00")
+
+        self.assertEquals(403, response.status_code)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_resent_notification_stored_once(self):
+        self.post_event('net.authorize.payment.void.created', '1234')
+        self.post_event('net.authorize.payment.void.created', '1234')
+
+        self.assertEquals(1, WebhookEvent.objects.count())
+
+    def test_drain_cancels_subscription_receipt(self):
+        receipt = Receipt.objects.create(profile=self.profile, order_item=OrderItem.objects.get(pk=5), transaction="5500", status=PurchaseStatus.COMPLETE, start_date=timezone.now(), auto_renew=True)
+        self.post_event('net.authorize.customer.subscription.suspended', '5500', notification_id="n-1")
+        self.post_event('net.authorize.customer.subscription.cancelled', '5500', notification_id="n-2")
+
+        summary = drain_webhook_events()
+
+        self.assertEquals({'events': 2, 'receipts': 1, 'payments': 0}, summary)
+        receipt.refresh_from_db()
+        self.assertEquals(PurchaseStatus.CANCELED, receipt.status)
+        self.assertEquals('n-2', receipt.meta['gateway_event']['notification_id'])
+        self.assertFalse(WebhookEvent.objects.filter(processed=None).exists())
+
+    def test_drain_updates_payment_success(self):
+        payment = Payment.objects.create(invoice_id=1, profile=self.profile, transaction="7700", amount=10, success=True, payee_full_name="Bob Ross")
+        self.post_event('net.authorize.payment.void.created', '7700')
+
+        drain_webhook_events()
+
+        payment.refresh_from_db()
+        self.assertFalse(payment.success)
+        self.assertEquals('net.authorize.payment.void.created', payment.result['gateway_event']['event_type'])
+
+    def test_drain_payment_success_from_response_code(self):
+        declined = Payment.objects.create(invoice_id=1, profile=self.profile, transaction="7701", amount=10, success=True, payee_full_name="Bob Ross")
+        approved = Payment.objects.create(invoice_id=1, profile=self.profile, transaction="7702", amount=10, success=False, payee_full_name="Bob Ross")
+        self.post_event('net.authorize.payment.authcapture.created', '7701', notification_id="n-1", responseCode=2)
+        self.post_event('net.authorize.payment.authcapture.created', '7702', notification_id="n-2", responseCode=1)
+
+        drain_webhook_events()
+
+        self.assertFalse(Payment.objects.get(pk=declined.pk).success)
+        self.assertTrue(Payment.objects.get(pk=approved.pk).success)
+
+    def test_drain_keeps_unsupported_events(self):
+        payment = Payment.objects.create(invoice_id=1, profile=self.profile, transaction="7700", amount=10, success=True, payee_full_name="Bob Ross")
+        self.post_event('net.authorize.payment.refund.created', '7799', notification_id="n-1", responseCode=1)
+        self.post_event('net.authorize.payment.void.created', '7700', notification_id="n-2")
+
+        summary = drain_webhook_events(limit=1)
+
+        self.assertEquals({'events': 1, 'receipts': 0, 'payments': 1}, summary)
+        self.assertEquals(['net.authorize.payment.refund.created'], list(WebhookEvent.objects.filter(processed=None).values_list('event_type', flat=True)))
+
+    def test_drain_skips_processed_events(self):
+        self.post_event('net.authorize.payment.void.created', '7700')
+        drain_webhook_events()
+
+        self.assertEquals(0, drain_webhook_events()['events'])
+
+    def test_drain_command(self):
+        self.post_event('net.authorize.payment.void.created', '7700')
+        out = StringIO()
+
+        call_command('drain_webhook_events', '--once', stdout=out)
+
+        self.assertIn("1 events", out.getvalue())
@@ -1,19 +1,23 @@
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.sites.models import Site
+from django.contrib.sites.shortcuts import get_current_site
 from django.shortcuts import render
 from django.utils import timezone
 from django.views.generic import TemplateView
 from django.views.generic.list import ListView
 
-from vendor.models import Offer, Payment
+from vendor.models import Offer, Payment, StorefrontOffer
+from vendor.models.storefront import get_storefront_offers
 from vendor.views.mixin import ProductRequiredMixin
 from vendor.forms import CreditCardForm
 from vendor.models.choice import PurchaseStatus, TermType, PaymentTypes
 
 class VendorIndexView(ListView):
     template_name = "core/index.html"
-    model = Offer
-    queryset = Offer.on_site_active.all()
+    model = StorefrontOffer
+
+    def get_queryset(self):
+        return get_storefront_offers(get_current_site(self.request))
 
 
 class ProductAccessView(ProductRequiredMixin, TemplateView):
@@ -180,6 +180,7 @@ AVAILABLE_CURRENCIES = {'usd': _('USD Dollars'), 'mxn': _('Mexican peso'), 'jpy'
 AUTHORIZE_NET_API_ID = os.getenv("AUTHORIZE_NET_API_ID")
 AUTHORIZE_NET_TRANSACTION_KEY = os.getenv("AUTHORIZE_NET_TRANSACTION_KEY")
 AUTHORIZE_NET_KEY = os.getenv("AUTHORIZE_NET_KEY")
+AUTHORIZE_NET_SIGNATURE_KEY = os.getenv("AUTHORIZE_NET_SIGNATURE_KEY")
 AUTHOIRZE_NET_TRANSACTION_TYPE_DEFAULT = os.getenv("AUTHOIRZE_NET_TRANSACTION_TYPE_DEFAULT")
 
 # Stripe Settings